@@ -1,15 +1,20 @@
 import os
 import requests
 import json
+import gzip
 from dotenv import load_dotenv
 from langchain.schema import AIMessage, HumanMessage, BaseMessage
 from langchain_community.chat_message_histories import ChatMessageHistory
 from typing import List, Optional
 import configparser
+import time
 from yaspin import yaspin
 
 
 class Chat:
+    # Cold chats may be compressed to <chat_history_file>.gz by Chat_Maintenance
+    COMPRESSED_SUFFIX = ".gz"
+
     def __init__(self, chat_history_file=None):
         """
         Initialize the Chat.
@@ -19,7 +24,8 @@ class Chat:
         """
         self.chat_active = True
         self.chat_history_file = chat_history_file
-        if chat_history_file is not None:
+        self.last_usage = None
+        if chat_history_file is not None and not os.path.exists(chat_history_file + self.COMPRESSED_SUFFIX):
             self.ensure_file_path_exists(chat_history_file)        
         self.chat_history = self.load_chat_history(chat_history_file) 
 
@@ -36,6 +42,8 @@ class Chat:
             "role": "user" if isinstance(message, HumanMessage) else "assistant",
             "content": message.content
         }
+        if message.additional_kwargs.get("usage"):
+            msg_dict["usage"] = message.additional_kwargs["usage"]
         with open(chat_history_file, "a") as file:
             file.write(json.dumps(msg_dict) + "\n")
             
@@ -86,16 +94,16 @@ class Chat:
             with open(file_path, "w") as file:
                 file.write("")  # Create an empty file
             print(f"File created: {file_path}")
-        else:
-            print(f"File already exists: {file_path}")
             
     def get_ai_response(self, user_input, AI):
         response = ''    
         spinner_active = True
+        start_time = time.monotonic()
 
         with yaspin(text=AI.get_llm_name() + ': ', spinner='dots', side='right') as spinner:
             try:
-                for chunk in AI.get_response(prompt=user_input, history=self.chat_history):
+                for chunk in AI.get_response(prompt=user_input, history=self.chat_history,
+                                             session_id=self.chat_history_file):
                     # Stop the spinner once we start receiving data
                     if spinner_active:
                         spinner.stop()
@@ -107,6 +115,11 @@ class Chat:
                 raise e
         
         response = response.strip()
+        # Handlers fill in last_usage once the response is complete
+        usage = dict(getattr(AI, "last_usage", None) or {})
+        if usage:
+            usage["duration"] = round(time.monotonic() - start_time, 3)
+        self.last_usage = usage or None
         
         # Add user message to history and file
         user_message = HumanMessage(content=user_input)
@@ -114,6 +127,8 @@ class Chat:
         self.append_message_to_history_file(user_message, self.chat_history_file)
         # Add LLM's response to history and file
         assistant_message = AIMessage(content=response)
+        if self.last_usage:
+            assistant_message.additional_kwargs["usage"] = self.last_usage
         self.chat_history.add_message(assistant_message)
         self.append_message_to_history_file(assistant_message, self.chat_history_file)
         
@@ -134,13 +149,54 @@ class Chat:
                 
         return message_list
             
+    def get_usage_totals(self):
+        """
+        Totals the token usage stored with this chat's messages, per model.
+
+        Returns:
+            dict: Maps model name to its prompt, completion and total token counts.
+        """
+        totals = {}
+        for msg in self.chat_history.messages:
+            usage = msg.additional_kwargs.get("usage")
+            if not usage:
+                continue
+            model_totals = totals.setdefault(
+                usage.get("model", "unknown"),
+                {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            )
+            model_totals["requests"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                model_totals[key] += usage.get(key) or 0
+        return totals
+
     def get_user_input(self):
         user_input = input("You: ").strip()
         return user_input
             
+    @staticmethod
+    def read_history_lines(chat_history_file):
+        """
+        Read the lines of a chat history, transparently decompressing it. A compressed
+        chat is read first, followed by any messages appended to the plain file since.
+
+        Args:
+            chat_history_file (str): Filepath of the chat history (without the .gz suffix).
+
+        Yields:
+            str: Each line of the chat history.
+        """
+        compressed_file = chat_history_file + Chat.COMPRESSED_SUFFIX
+        if os.path.exists(compressed_file):
+            with gzip.open(compressed_file, "rt") as file:
+                yield from file
+        if os.path.exists(chat_history_file):
+            with open(chat_history_file, "r") as file:
+                yield from file
+
     def load_chat_history(self, chat_history_file):
         """
-        Load chat history from a JSON Lines file.
+        Load chat history from a JSON Lines file, or its compressed .gz copy.
         Returns:
             ChatMessageHistory: The loaded chat history, or a new history if the file doesn't exist.
         """
@@ -148,16 +204,17 @@ class Chat:
             return ChatMessageHistory()
         
         history = ChatMessageHistory()
-        if os.path.exists(chat_history_file):
-            with open(chat_history_file, "r") as file:
-                for line in file:
-                    try:
-                        msg = json.loads(line.strip())
-                        if msg["role"] == "user":
-                            history.add_message(HumanMessage(content=msg["content"]))
-                        elif msg["role"] == "assistant":
-                            history.add_message(AIMessage(content=msg["content"]))
-                    except json.JSONDecodeError:
-                        print("Error decoding a line in chat history. Skipping.")
+        for line in self.read_history_lines(chat_history_file):
+            try:
+                msg = json.loads(line.strip())
+                if msg["role"] == "user":
+                    history.add_message(HumanMessage(content=msg["content"]))
+                elif msg["role"] == "assistant":
+                    message = AIMessage(content=msg["content"])
+                    if msg.get("usage"):
+                        message.additional_kwargs["usage"] = msg["usage"]
+                    history.add_message(message)
+            except json.JSONDecodeError:
+                print("Error decoding a line in chat history. Skipping.")
         return history
         
\ No newline at end of file
@@ -29,13 +29,15 @@ class ChatGPT_Handler(LLM_Handler):
     def get_llm_name(self):
         return 'ChatGPT'
 
-    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None) -> str:
+    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None,
+                     session_id: Optional[str] = None) -> str:
         """
         Get a response from ChatGPT based on the prompt and conversation history.
 
         Args:
             prompt (str): The user's prompt.
             history (ChatMessageHistory, optional): The conversation history.
+            session_id (str, optional): Identifier of the chat the request belongs to.
 
         Returns:
             str: The assistant's response.
@@ -47,11 +49,14 @@ class ChatGPT_Handler(LLM_Handler):
 
         # Add the current user prompt
         messages.append({"role": "user", "content": prompt})
+        self.last_usage = None
 
         try:
             response = self.client.chat.completions.create(model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content": prompt}]
             )
+            if response.usage is not None:
+                self.last_usage = self.make_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
             assistant_message = response.choices[0].message.content
             return assistant_message.strip()
         except requests.exceptions.RequestException as e:
@@ -0,0 +1,320 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from .Chat import Chat
+
+
+class Chat_Cache:
+    """
+    An in-memory LRU cache of loaded Chat objects with background prefetch.
+
+    Entries are keyed by chat file path and stamped with the file's size and
+    modification time, so a chat is only re-parsed when its file changes on disk.
+    Chat summaries are stamped the same way and persisted to an index file in the
+    chats directory, so only changed chats are read, even after a restart.
+    """
+
+    SUMMARY_INDEX_FILE = ".summary_index"
+
+    def __init__(self, chats_dir: str, max_chats: int = 16, prefetch_count: int = 4):
+        """
+        Initialize the Chat_Cache.
+
+        Args:
+            chats_dir (str): Directory holding the chat history files.
+            max_chats (int): Maximum number of parsed chats kept in memory.
+            prefetch_count (int): Number of most recently modified chats to prefetch.
+        """
+        self.chats_dir = chats_dir
+        self.max_chats = max_chats
+        self.prefetch_count = prefetch_count
+        self.chats = OrderedDict()  # path -> (stamp, Chat)
+        self.summaries = {}         # filename -> (stamp, summary dict)
+        self.summaries_loaded = False
+        self.summaries_dirty = False
+        self.lock = threading.Lock()
+        self.maintenance_skip = None  # Chat files readable while maintenance rewrites the others
+        self.maintenance_done = threading.Condition(self.lock)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-prefetch")
+
+    def file_stamp(self, file_path: str):
+        """
+        Get a cheap change marker for a chat file, including its compressed copy.
+
+        Args:
+            file_path (str): Path to the chat file.
+
+        Returns:
+            tuple: (size, mtime_ns) of the chat, or None if it doesn't exist.
+        """
+        stamp = None
+        for path in (file_path, file_path + Chat.COMPRESSED_SUFFIX):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stamp is None:
+                stamp = (stat.st_size, stat.st_mtime_ns)
+            else:
+                stamp = (stamp[0] + stat.st_size, max(stamp[1], stat.st_mtime_ns))
+        return stamp
+
+    def get(self, file_path: str) -> Chat:
+        """
+        Get the Chat for a file, loading it only if it isn't cached or has changed.
+
+        Args:
+            file_path (str): Path to the chat file.
+
+        Returns:
+            Chat: The loaded chat.
+        """
+        self.wait_for_maintenance(os.path.basename(file_path))
+        stamp = self.file_stamp(file_path)
+        with self.lock:
+            entry = self.chats.get(file_path)
+            if entry is not None and stamp is not None and entry[0] == stamp:
+                self.chats.move_to_end(file_path)
+                return entry[1]
+
+        chat = Chat(file_path)
+        # Keep the stamp taken before parsing: if the file was appended to meanwhile,
+        # the entry is stale and the next lookup re-parses it
+        self.store(file_path, chat, stamp)
+        return chat
+
+    def store(self, file_path: str, chat: Chat, stamp=None):
+        """
+        Record a chat in the cache, evicting the least recently used chat if the
+        cache is full.
+
+        Args:
+            file_path (str): Path to the chat file.
+            chat (Chat): The chat loaded from that file.
+            stamp (tuple, optional): The file stamp the chat's history matches.
+                Defaults to the current file stamp.
+        """
+        if stamp is None:
+            stamp = self.file_stamp(file_path)
+        with self.lock:
+            self.chats[file_path] = (stamp, chat)
+            self.chats.move_to_end(file_path)
+            while len(self.chats) > self.max_chats:
+                self.chats.popitem(last=False)
+
+    def refresh(self, chat: Chat):
+        """
+        Re-stamp a cached chat after it appended to its own file, so the
+        in-memory history is reused instead of re-parsed on the next lookup.
+
+        Args:
+            chat (Chat): A chat that has just been written to.
+        """
+        if chat.chat_history_file is None:
+            return
+        with self.lock:
+            entry = self.chats.get(chat.chat_history_file)
+            if entry is None or entry[1] is not chat:
+                return
+        self.store(chat.chat_history_file, chat)
+
+    def begin_maintenance(self, skip_chat_files):
+        """
+        Hold back reads of chat files while maintenance rewrites them. Chats
+        maintenance leaves alone can still be read.
+
+        Args:
+            skip_chat_files (Iterable[str]): Chat file names maintenance won't touch.
+        """
+        with self.lock:
+            self.maintenance_skip = set(skip_chat_files)
+
+    def end_maintenance(self):
+        """
+        Drop the cached chats, which may have been rewritten, and release waiting readers.
+        Summaries are kept, since their stamps already tell whether a chat changed.
+        """
+        with self.lock:
+            self.maintenance_skip = None
+            self.chats.clear()
+            self.maintenance_done.notify_all()
+
+    def wait_for_maintenance(self, chat_file: Optional[str] = None):
+        """
+        Wait until maintenance is done, unless it leaves the given chat alone.
+
+        Args:
+            chat_file (str, optional): The chat file about to be read. Waits for any
+                maintenance if None.
+        """
+        with self.lock:
+            self.maintenance_done.wait_for(
+                lambda: self.maintenance_skip is None or chat_file in self.maintenance_skip
+            )
+
+    def list_chat_files(self) -> List[str]:
+        """
+        List chat files, most recently modified first. Compressed chats are
+        listed under their uncompressed name.
+
+        Returns:
+            List[str]: Chat file names in the chats directory.
+        """
+        if not os.path.exists(self.chats_dir):
+            return []
+        mtimes = {}
+        for entry in os.scandir(self.chats_dir):
+            name = entry.name
+            if name.endswith(".json" + Chat.COMPRESSED_SUFFIX):
+                name = name[:-len(Chat.COMPRESSED_SUFFIX)]
+            if not entry.is_file() or not name.endswith(".json"):
+                continue
+            mtimes[name] = max(mtimes.get(name, 0), entry.stat().st_mtime_ns)
+        return sorted(mtimes, key=mtimes.get, reverse=True)
+
+    def count_messages(self, file_path: str) -> int:
+        """
+        Count the messages in a chat file without building LangChain messages.
+
+        Args:
+            file_path (str): Path to the chat file.
+
+        Returns:
+            int: Number of user/assistant messages in the file.
+        """
+        count = 0
+        for line in Chat.read_history_lines(file_path):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                if json.loads(line).get("role") in ("user", "assistant"):
+                    count += 1
+            except (json.JSONDecodeError, AttributeError):
+                continue
+        return count
+
+    def get_summary(self, chat_file: str) -> Optional[dict]:
+        """
+        Get the title, message count and last-modified time of a chat. Files are
+        only read when they changed since the last summary and aren't cached.
+
+        Args:
+            chat_file (str): Chat file name inside the chats directory.
+
+        Returns:
+            dict: The chat summary, or None if the file no longer exists.
+        """
+        file_path = os.path.join(self.chats_dir, chat_file)
+        stamp = self.file_stamp(file_path)
+        if stamp is None:
+            return None
+
+        with self.lock:
+            cached = self.summaries.get(chat_file)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+            entry = self.chats.get(file_path)
+
+        if entry is not None and entry[0] == stamp:
+            message_count = len(entry[1].chat_history.messages)
+        else:
+            message_count = self.count_messages(file_path)
+
+        summary = {
+            "chat_id": chat_file,
+            "title": os.path.splitext(chat_file)[0],
+            "message_count": message_count,
+            "last_modified": stamp[1] / 1e9,
+        }
+        with self.lock:
+            self.summaries[chat_file] = (stamp, summary)
+            self.summaries_dirty = True
+        return summary
+
+    def load_summary_index(self):
+        """
+        Load the persisted summary index, once per process.
+        """
+        with self.lock:
+            if self.summaries_loaded:
+                return
+            self.summaries_loaded = True
+        index_path = os.path.join(self.chats_dir, self.SUMMARY_INDEX_FILE)
+        try:
+            with open(index_path, "r") as file:
+                index = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return
+        with self.lock:
+            for chat_file, entry in index.items():
+                if chat_file not in self.summaries:
+                    self.summaries[chat_file] = (tuple(entry["stamp"]), entry["summary"])
+
+    def save_summary_index(self, chat_files: List[str]):
+        """
+        Persist the summaries of the given chats, if any changed since the last save.
+
+        Args:
+            chat_files (List[str]): The chats currently in the chats directory.
+        """
+        with self.lock:
+            stale = set(self.summaries) - set(chat_files)
+            for chat_file in stale:
+                del self.summaries[chat_file]
+            if not self.summaries_dirty and not stale:
+                return
+            index = {
+                chat_file: {"stamp": list(stamp), "summary": summary}
+                for chat_file, (stamp, summary) in self.summaries.items()
+            }
+            self.summaries_dirty = False
+        index_path = os.path.join(self.chats_dir, self.SUMMARY_INDEX_FILE)
+        try:
+            with open(index_path + ".tmp", "w") as file:
+                json.dump(index, file)
+            os.replace(index_path + ".tmp", index_path)
+        except OSError as e:
+            print(f"Error saving chat summary index: {e}")
+
+    def get_summaries(self) -> List[dict]:
+        """
+        Get summaries for every chat, most recently modified first.
+
+        Returns:
+            List[dict]: One summary per chat file.
+        """
+        self.wait_for_maintenance()
+        self.load_summary_index()
+        chat_files = self.list_chat_files()
+        summaries = [self.get_summary(f) for f in chat_files]
+        self.save_summary_index(chat_files)
+        return [s for s in summaries if s is not None]
+
+    def prefetch(self, chat_files: Optional[List[str]] = None):
+        """
+        Load chats into the cache on a background thread.
+
+        Args:
+            chat_files (List[str], optional): Chat file names to load. Defaults to
+                the most recently modified chats.
+        """
+        if chat_files is None:
+            chat_files = self.list_chat_files()[:self.prefetch_count]
+        for chat_file in chat_files:
+            self.executor.submit(self.prefetch_one, os.path.join(self.chats_dir, chat_file))
+
+    def prefetch_one(self, file_path: str):
+        """
+        Load a single chat into the cache, ignoring errors.
+
+        Args:
+            file_path (str): Path to the chat file.
+        """
+        try:
+            self.get(file_path)
+        except Exception as e:
+            print(f"Error prefetching chat {file_path}: {e}")
@@ -0,0 +1,262 @@
+import os
+import re
+import json
+import gzip
+import time
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+from .Chat import Chat
+
+# Copies made by create_chat when a name is taken, e.g. "notes (2).json"
+DUPLICATE_NAME_PATTERN = re.compile(r"^(.*) \(\d+\)\.json$")
+# Lines compaction can't keep as messages are moved to <chat>.json.rejected instead of dropped
+REJECTED_SUFFIX = ".rejected"
+
+
+def maintain_chat_file(chats_dir: str, chat_id: str, options: dict) -> dict:
+    """
+    Compact a single chat: drop blank and consecutively repeated message lines,
+    and move lines that aren't user/assistant messages to <chat>.json.rejected.
+    A chat without messages is removed once it has been unmodified for long
+    enough, unless it holds such lines or has rejected lines kept for it. A chat
+    is compressed once it has been unmodified for compress_after_days; an
+    already compressed chat stays compressed, with any messages appended since
+    folded into it, unless decompress is set. Runs in a worker process.
+
+    Args:
+        chats_dir (str): Directory holding the chat history files.
+        chat_id (str): Chat file name (without the .gz suffix).
+        options (dict): Maintenance options, see Chat_Maintenance.run.
+
+    Returns:
+        dict: What was done to the chat and its size before and after.
+    """
+    plain_file = os.path.join(chats_dir, chat_id)
+    compressed_file = plain_file + Chat.COMPRESSED_SUFFIX
+    existing = [p for p in (plain_file, compressed_file) if os.path.exists(p)]
+    stats = [os.stat(p) for p in existing]
+    bytes_before = sum(s.st_size for s in stats)
+    mtime = max(s.st_mtime for s in stats)
+    age = time.time() - mtime
+
+    messages = []
+    rejected_lines = []
+    duplicate_lines = 0
+    for line in Chat.read_history_lines(plain_file):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            msg = json.loads(line)
+        except json.JSONDecodeError:
+            rejected_lines.append(line)
+            continue
+        if not isinstance(msg, dict) or msg.get("role") not in ("user", "assistant") or "content" not in msg:
+            rejected_lines.append(line)
+            continue
+        if messages and messages[-1] == msg:
+            duplicate_lines += 1
+            continue
+        messages.append(msg)
+
+    result = {
+        "chat_id": chat_id,
+        "action": "unchanged",
+        "messages": len(messages),
+        "malformed_lines": len(rejected_lines),
+        "duplicate_lines": duplicate_lines,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_before,
+        "content_hash": None,
+        "mtime": mtime,
+    }
+
+    rejected_file = plain_file + REJECTED_SUFFIX
+    if not messages:
+        # Never delete lines that couldn't be read as messages; leave such chats for a person to look at
+        if rejected_lines or os.path.exists(rejected_file):
+            return result
+        if age < options["remove_empty_after_hours"] * 3600:
+            return result
+        result["action"] = "removed"
+        result["bytes_after"] = 0
+        if not options["dry_run"]:
+            for path in existing:
+                os.remove(path)
+        return result
+
+    content = "".join(json.dumps(msg) + "\n" for msg in messages).encode()
+    result["content_hash"] = hashlib.sha256(content).hexdigest()
+
+    compress_after_days = options["compress_after_days"]
+    if options["decompress"]:
+        compress = False
+    else:
+        compress = compressed_file in existing or (
+            compress_after_days is not None and age >= compress_after_days * 86400
+        )
+    target_file = compressed_file if compress else plain_file
+    if existing == [target_file] and not rejected_lines and not duplicate_lines:
+        # Already compact and stored in the right form; avoid rewriting it
+        return result
+
+    if compress:
+        data = gzip.compress(content, mtime=0)
+        result["action"] = "compacted" if compressed_file in existing else "compressed"
+    else:
+        data = content
+        result["action"] = "decompressed" if compressed_file in existing else "compacted"
+    result["bytes_after"] = len(data)
+    if options["dry_run"]:
+        return result
+
+    if rejected_lines:
+        with open(rejected_file, "a") as file:
+            file.write("".join(line + "\n" for line in rejected_lines))
+
+    temp_file = target_file + ".tmp"
+    with open(temp_file, "wb") as file:
+        file.write(data)
+    # Keep the original modification time so the chat's age and ordering don't change
+    os.utime(temp_file, (mtime, mtime))
+    os.replace(temp_file, target_file)
+    for path in existing:
+        if path != target_file:
+            os.remove(path)
+    return result
+
+
+class Chat_Maintenance:
+    """
+    Garbage collects and compacts the chats directory, processing chats in parallel.
+    """
+
+    def __init__(self, chats_dir: str, workers: Optional[int] = None):
+        """
+        Initialize the Chat_Maintenance.
+
+        Args:
+            chats_dir (str): Directory holding the chat history files.
+            workers (int, optional): Number of worker processes. Defaults to the CPU count.
+        """
+        self.chats_dir = chats_dir
+        self.workers = workers
+
+    def list_chat_ids(self) -> List[str]:
+        """
+        List the chats in the chats directory, compressed or not.
+
+        Returns:
+            List[str]: Chat file names (without the .gz suffix).
+        """
+        if not os.path.exists(self.chats_dir):
+            return []
+        chat_ids = set()
+        for name in os.listdir(self.chats_dir):
+            if name.endswith(".json" + Chat.COMPRESSED_SUFFIX):
+                name = name[:-len(Chat.COMPRESSED_SUFFIX)]
+            if name.endswith(".json"):
+                chat_ids.add(name)
+        return sorted(chat_ids)
+
+    def remove_duplicate_chats(self, results: List[dict], dry_run: bool) -> List[dict]:
+        """
+        Remove "<name> (n).json" copies whose messages are identical to "<name>.json"
+        or to another copy of it. Chats with a different base name are never compared.
+
+        Args:
+            results (List[dict]): Per-chat results of maintain_chat_file.
+            dry_run (bool): Only report what would be removed.
+
+        Returns:
+            List[dict]: The results, with removed duplicates marked as such.
+        """
+        groups = {}
+        for result in results:
+            if result["content_hash"] is None or result["action"] == "removed":
+                continue
+            match = DUPLICATE_NAME_PATTERN.match(result["chat_id"])
+            base_name = match.group(1) if match else result["chat_id"][:-len(".json")]
+            groups.setdefault((base_name, result["content_hash"]), []).append(result)
+
+        for group in groups.values():
+            if len(group) < 2:
+                continue
+            # Keep the original the copies were made from, or else the oldest copy
+            group.sort(key=lambda r: (DUPLICATE_NAME_PATTERN.match(r["chat_id"]) is not None, r["mtime"]))
+            for duplicate in group[1:]:
+                duplicate["action"] = "removed_duplicate"
+                duplicate["duplicate_of"] = group[0]["chat_id"]
+                duplicate["bytes_after"] = 0
+                if dry_run:
+                    continue
+                plain_file = os.path.join(self.chats_dir, duplicate["chat_id"])
+                for path in (plain_file, plain_file + Chat.COMPRESSED_SUFFIX):
+                    if os.path.exists(path):
+                        os.remove(path)
+        return results
+
+    def run(self, remove_empty_after_hours: float = 24, compress_after_days: Optional[float] = None,
+            decompress: bool = False, dry_run: bool = False,
+            skip_chat_ids: Optional[Iterable[str]] = None) -> dict:
+        """
+        Run maintenance over every chat.
+
+        Args:
+            remove_empty_after_hours (float): Remove chats that have no messages and
+                haven't been modified for this many hours.
+            compress_after_days (float, optional): Compress chats that haven't been
+                modified for this many days. No new chats are compressed if None.
+            decompress (bool): Decompress every compressed chat.
+            dry_run (bool): Only report what would be done.
+            skip_chat_ids (Iterable[str], optional): Chats to leave untouched, e.g.
+                ones that may be appended to while maintenance runs.
+
+        Returns:
+            dict: Per-chat results and totals, including the bytes reclaimed.
+        """
+        options = {
+            "remove_empty_after_hours": remove_empty_after_hours,
+            "compress_after_days": compress_after_days,
+            "decompress": decompress,
+            "dry_run": dry_run,
+        }
+        skip_chat_ids = set(skip_chat_ids or ())
+        all_chat_ids = self.list_chat_ids()
+        chat_ids = [c for c in all_chat_ids if c not in skip_chat_ids]
+        results = [
+            {"chat_id": c, "action": "skipped", "bytes_before": 0, "bytes_after": 0, "content_hash": None}
+            for c in all_chat_ids if c in skip_chat_ids
+        ]
+        if chat_ids:
+            # Spawn rather than fork: the server process runs several threads
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=mp_context) as executor:
+                futures = [executor.submit(maintain_chat_file, self.chats_dir, c, options) for c in chat_ids]
+                for chat_id, future in zip(chat_ids, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        print(f"Error maintaining chat {chat_id}: {e}")
+                        results.append({"chat_id": chat_id, "action": "error", "error": str(e),
+                                        "bytes_before": 0, "bytes_after": 0, "content_hash": None})
+        results = self.remove_duplicate_chats(results, dry_run)
+
+        actions = {}
+        for result in results:
+            actions[result["action"]] = actions.get(result["action"], 0) + 1
+        bytes_before = sum(r["bytes_before"] for r in results)
+        bytes_after = sum(r["bytes_after"] for r in results)
+        return {
+            "dry_run": dry_run,
+            "chats_scanned": len(results),
+            "actions": actions,
+            "malformed_lines": sum(r.get("malformed_lines", 0) for r in results),
+            "duplicate_lines": sum(r.get("duplicate_lines", 0) for r in results),
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": bytes_before - bytes_after,
+            "chats": [{k: v for k, v in r.items() if k not in ("content_hash", "mtime")} for r in results],
+        }
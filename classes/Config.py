@@ -0,0 +1,21 @@
+import configparser
+
+CONFIG_FILE = "config/config.ini"
+
+
+def load_config(config_file: str = CONFIG_FILE) -> configparser.ConfigParser:
+    """
+    Load the application config file.
+
+    Only '=' separates keys from values, since keys may contain Ollama model
+    names such as llama2:latest, which ConfigParser splits on ':' by default.
+
+    Args:
+        config_file (str): Path to the config file.
+
+    Returns:
+        configparser.ConfigParser: The loaded config (empty if the file doesn't exist).
+    """
+    config = configparser.ConfigParser(delimiters=("=",))
+    config.read(config_file)
+    return config
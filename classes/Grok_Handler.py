@@ -29,13 +29,15 @@ class Grok_Handler(LLM_Handler):
     def get_llm_name(self):
         return 'Grok'
 
-    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None) -> str:
+    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None,
+                     session_id: Optional[str] = None) -> str:
         """
         Get a response from Grok based on the prompt and conversation history.
 
         Args:
             prompt (str): The user's prompt.
             history (ChatMessageHistory, optional): The conversation history.
+            session_id (str, optional): Identifier of the chat the request belongs to.
 
         Returns:
             str: The assistant's response.
@@ -47,6 +49,7 @@ class Grok_Handler(LLM_Handler):
 
         # Add the current user prompt
         messages.append({"role": "user", "content": prompt})
+        self.last_usage = None
 
         # Make the API call
         headers = {
@@ -62,7 +65,10 @@ class Grok_Handler(LLM_Handler):
         try:
             response = requests.post(self.base_url, json=payload, headers=headers)
             response.raise_for_status()  # Raise an error for HTTP codes 4xx/5xx
-            assistant_message = response.json()["choices"][0]["message"]["content"]
+            response_json = response.json()
+            usage = response_json.get("usage") or {}
+            self.last_usage = self.make_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+            assistant_message = response_json["choices"][0]["message"]["content"]
             return assistant_message.strip()
         except requests.exceptions.RequestException as e:
             print(f"Error communicating with Grok API: {e}")
@@ -6,6 +6,7 @@ from langchain_community.chat_message_histories import ChatMessageHistory
 from typing import List, Optional
 import configparser
 from abc import ABC, abstractmethod
+from .Config import load_config
 
 
 class LLM_Handler:
@@ -22,10 +23,10 @@ class LLM_Handler:
             temperature (float): The temperature setting for the model's responses.
         """
         # Load configuration file
-        self.config = configparser.ConfigParser()
-        self.config.read("config/config.ini")
+        self.config = load_config()
         self.model_name = model_name
         self.temperature = temperature
+        self.last_usage = None
 
     def convert_messages(self, messages: List[BaseMessage]) -> List[dict]:
         """
@@ -47,19 +48,41 @@ class LLM_Handler:
                 # For any other message types, default to 'user' role
                 converted_messages.append({"role": "user", "content": message.content})
         return converted_messages
+
+    def make_usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> dict:
+        """
+        Build the usage record for a response, stored in self.last_usage.
+
+        Args:
+            prompt_tokens (int, optional): Number of tokens in the prompt.
+            completion_tokens (int, optional): Number of tokens in the response.
+
+        Returns:
+            dict: Token counts of the response.
+        """
+        prompt_tokens = prompt_tokens or 0
+        completion_tokens = completion_tokens or 0
+        return {
+            "model": self.get_llm_name(),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
     
     @abstractmethod
     def get_llm_name(self):
         pass
 
     @abstractmethod
-    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None) -> str:
+    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None,
+                     session_id: Optional[str] = None) -> str:
         """
         Get a response from LLM based on the prompt and conversation history.
 
         Args:
             prompt (str): The user's prompt.
             history (ChatMessageHistory, optional): The conversation history.
+            session_id (str, optional): Identifier of the chat the request belongs to.
 
         Returns:
             str: The assistant's response.
@@ -3,31 +3,157 @@ from yaspin import yaspin
 from langchain.schema import AIMessage, HumanMessage, BaseMessage
 from langchain_community.chat_message_histories import ChatMessageHistory
 from typing import List, Optional
+from collections import OrderedDict
+import threading
 from .LLM_Handler import LLM_Handler
 
 class Local_LLM_Handler(LLM_Handler):
     """
     A handler class for interacting with a local LLM (like llama3.3) via Ollama with streaming and a yaspin spinner.
+
+    With prefix reuse enabled, the model is kept loaded between turns and each chat
+    is tracked as a session. Ollama only caches the last prompt it evaluated, so a
+    turn can only reuse the prefix when it continues the chat served last and that
+    chat's history only grew. Edited or truncated histories and switches between
+    chats are detected and counted as cold turns.
     """
 
-    def __init__(self, model_name: str = "llama3.3:latest", temperature: float = 0.7):
+    def __init__(self, model_name: str = "llama3.3:latest", temperature: float = 0.7,
+                 prefix_reuse: Optional[bool] = None, keep_alive: Optional[str] = None,
+                 max_sessions: int = 32):
         """
         Initialize the Local_LLM_Handler.
 
         Args:
             model_name (str): The name of the local LLM model to use.
             temperature (float): The temperature setting for the model's responses.
+            prefix_reuse (bool, optional): Whether to keep the model loaded and track per-chat
+                sessions. Defaults to PREFIX_REUSE in the [OLLAMA] config section, or True.
+            keep_alive (str, optional): How long Ollama keeps the model loaded after a request.
+                Defaults to KEEP_ALIVE in the [OLLAMA] config section, or "30m".
+            max_sessions (int): Maximum number of chat sessions to track.
+        """
+        super().__init__(model_name, temperature)
+        if prefix_reuse is None:
+            prefix_reuse = self.config.getboolean("OLLAMA", "PREFIX_REUSE", fallback=True)
+        if keep_alive is None:
+            keep_alive = self.config.get("OLLAMA", "KEEP_ALIVE", fallback="") or "30m"
+        self.prefix_reuse = prefix_reuse
+        self.keep_alive = keep_alive
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # session_id -> session state and stats
+        self.last_session_id = None    # Chat whose prompt Ollama evaluated last
+        self.prompt_eval_rate = None   # Seconds per prompt token, measured on cold turns
+        self.lock = threading.Lock()   # The handler is shared by concurrent streams
+
+    def get_session(self, session_id: Optional[str]) -> Optional[dict]:
         """
-        self.model_name = model_name
-        self.temperature = temperature
+        Get or create the tracked session for a chat. The caller must hold self.lock.
 
-    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None) -> str:
+        Args:
+            session_id (str, optional): Identifier of the chat, e.g. its history file.
+
+        Returns:
+            dict: The session, or None if prefix reuse is off or the chat has no id.
+        """
+        if not self.prefix_reuse or session_id is None:
+            return None
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = {
+                "messages": [],
+                "context_tokens": 0,
+                "turns": 0,
+                "warm_turns": 0,
+                "cold_turns": 0,
+                "prefix_resets": 0,
+                "session_switches": 0,
+                "cache_misses": 0,
+                "reused_tokens": 0,
+                "prompt_eval_seconds": 0.0,
+                "saved_seconds": 0.0,
+            }
+            self.sessions[session_id] = session
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return session
+
+    def update_session(self, session: dict, messages: List[dict], response: str, final_chunk,
+                       expect_warm: bool):
+        """
+        Record a completed turn in its session and estimate the prompt-eval time saved.
+
+        A turn only counts as warm when Ollama evaluated fewer prompt tokens than the
+        cached prefix holds; otherwise it re-evaluated the whole prompt.
+
+        Args:
+            session (dict): The chat's session.
+            messages (List[dict]): The messages sent to Ollama this turn.
+            response (str): The assistant's full response.
+            final_chunk: The final chunk of the Ollama stream, holding timing stats.
+            expect_warm (bool): Whether this turn continued the last served chat with an
+                unchanged prefix.
+        """
+        prompt_eval_count = final_chunk.get('prompt_eval_count') or 0
+        prompt_eval_seconds = (final_chunk.get('prompt_eval_duration') or 0) / 1e9
+        eval_count = final_chunk.get('eval_count') or 0
+        with self.lock:
+            if expect_warm and prompt_eval_count < session["context_tokens"]:
+                reused_tokens = session["context_tokens"]
+                session["warm_turns"] += 1
+                session["reused_tokens"] += reused_tokens
+                if self.prompt_eval_rate is not None:
+                    session["saved_seconds"] += reused_tokens * self.prompt_eval_rate
+                session["context_tokens"] += prompt_eval_count + eval_count
+            else:
+                if expect_warm:
+                    # The prefix should have been cached, but Ollama re-evaluated it anyway
+                    session["cache_misses"] += 1
+                session["cold_turns"] += 1
+                if prompt_eval_count:
+                    self.prompt_eval_rate = prompt_eval_seconds / prompt_eval_count
+                session["context_tokens"] = prompt_eval_count + eval_count
+
+            session["turns"] += 1
+            session["prompt_eval_seconds"] += prompt_eval_seconds
+            # Chat stores the stripped response, so that is what the next turn's prefix will hold
+            session["messages"] = messages + [{"role": "assistant", "content": response.strip()}]
+
+    def get_session_stats(self) -> dict:
+        """
+        Get prefix reuse statistics per session and in total.
+
+        Returns:
+            dict: Per-session and total turn counts, prompt-eval time and estimated time saved.
+        """
+        with self.lock:
+            sessions = {
+                session_id: {k: v for k, v in session.items() if k != "messages"}
+                for session_id, session in self.sessions.items()
+            }
+        totals = {
+            key: sum(s[key] for s in sessions.values())
+            for key in ("turns", "warm_turns", "cold_turns", "prefix_resets", "session_switches",
+                        "cache_misses", "reused_tokens", "prompt_eval_seconds", "saved_seconds")
+        }
+        return {
+            "model": self.model_name,
+            "prefix_reuse": self.prefix_reuse,
+            "keep_alive": self.keep_alive,
+            "sessions": sessions,
+            "totals": totals,
+        }
+
+    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None,
+                     session_id: Optional[str] = None) -> str:
         """
         Get a response from the local LLM based on the prompt and conversation history with streaming and a spinner.
 
         Args:
             prompt (str): The user's prompt.
             history (ChatMessageHistory, optional): The conversation history.
+            session_id (str, optional): Identifier of the chat, used to track prefix reuse.
 
         Returns:
             str: The assistant's response.
@@ -41,13 +167,37 @@ class Local_LLM_Handler(LLM_Handler):
                     messages.append({"role": "assistant", "content": message.content})
 
         messages.append({"role": "user", "content": prompt})
+        self.last_usage = None
+
+        with self.lock:
+            session = self.get_session(session_id)
+            expect_warm = False
+            if session is not None and session["messages"]:
+                if messages[:len(session["messages"])] != session["messages"]:
+                    # History was edited or truncated; Ollama will re-evaluate the whole prompt
+                    session["prefix_resets"] += 1
+                elif self.last_session_id != session_id:
+                    # Another chat used the model since; Ollama only caches the last prompt
+                    session["session_switches"] += 1
+                else:
+                    expect_warm = True
+            self.last_session_id = session_id
 
+        extra_args = {"keep_alive": self.keep_alive} if self.prefix_reuse else {}
         try:
             response = ollama.chat(model=self.model_name, 
                                   messages=messages, 
                                   options={"temperature": self.temperature}, 
-                                  stream=True)
+                                  stream=True,
+                                  **extra_args)
+            full_response = ''
             for chunk in response:
+                full_response += chunk['message']['content']
+                if chunk.get('done'):
+                    # Ollama reports token counts on the final chunk of the stream
+                    self.last_usage = self.make_usage(chunk.get('prompt_eval_count'), chunk.get('eval_count'))
+                    if session is not None:
+                        self.update_session(session, messages, full_response, chunk, expect_warm)
                 yield chunk['message']['content']
         except Exception as e:
             print(f"Error communicating with local LLM: {e}")
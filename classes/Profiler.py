@@ -0,0 +1,236 @@
+import os
+import sys
+import time
+import cProfile
+import pstats
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+
+class Profiler:
+    """
+    Profiles the server for a window of requests.
+
+    While a window is active, a background thread samples the stacks of all
+    threads into flamegraph-compatible folded stacks, tracemalloc tracks
+    allocations, and code wrapped in section() is recorded with cProfile.
+    When the window's requests are done, everything is dumped to a directory on a
+    background thread, so the request that ends the window isn't held up.
+    """
+
+    def __init__(self, output_dir: str = "./profiles"):
+        """
+        Initialize the Profiler.
+
+        Args:
+            output_dir (str): Directory the profile dumps are written to.
+        """
+        self.output_dir = output_dir
+        self.active = False
+        self.window = 0  # Incremented per window, so late requests from an earlier one aren't counted
+        self.lock = threading.Lock()
+        self.requests_left = 0
+        self.requests_in_flight = 0
+        self.interval = 0.005
+        self.samples = Counter()
+        self.profiles = []
+        self.sampler_thread = None
+        self.dump_thread = None
+        self.started_tracemalloc = False
+        self.started_at = None
+        self.last_dump = None
+
+    def start(self, requests: int = 20, interval_ms: float = 5.0):
+        """
+        Start profiling a window of requests.
+
+        Args:
+            requests (int): Number of requests to profile before dumping.
+            interval_ms (float): Stack sampling interval in milliseconds.
+
+        Raises:
+            ValueError: If a profiling window is already active or still being written.
+        """
+        with self.lock:
+            if self.active:
+                raise ValueError("A profiling window is already active.")
+            if self.dump_thread is not None and self.dump_thread.is_alive():
+                raise ValueError("The previous profile is still being written.")
+            self.active = True
+            self.window += 1
+            self.requests_left = requests
+            self.requests_in_flight = 0
+            self.interval = interval_ms / 1000.0
+            self.samples = Counter()
+            self.profiles = []
+            self.started_at = time.time()
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self.started_tracemalloc = True
+        self.sampler_thread = threading.Thread(target=self.sample_stacks, name="profiler-sampler", daemon=True)
+        self.sampler_thread.start()
+        print(f"Profiling the next {requests} requests.")
+
+    def get_status(self) -> dict:
+        with self.lock:
+            return {
+                "active": self.active,
+                "requests_left": self.requests_left,
+                "samples": sum(self.samples.values()),
+                "last_dump": self.last_dump,
+            }
+
+    def sample_stacks(self):
+        """
+        Sample the stacks of all other threads until the window ends.
+        """
+        own_id = threading.get_ident()
+        while self.active:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                with self.lock:
+                    self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    @contextmanager
+    def section(self):
+        """
+        Record the wrapped code with cProfile while a window is active.
+        Does nothing otherwise.
+        """
+        if not self.active:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running on this thread
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                self.profiles.append(profile)
+
+    def request_started(self) -> Optional[int]:
+        """
+        Count a request towards the active window.
+
+        Returns:
+            int: The window the request belongs to, or None if no window is active.
+        """
+        with self.lock:
+            if not self.active:
+                return None
+            self.requests_in_flight += 1
+            return self.window
+
+    def request_finished(self, window: Optional[int]):
+        """
+        Count a finished request, ending the window and dumping the profile on a
+        background thread once all of its requests are done.
+
+        Args:
+            window (int, optional): The window returned by request_started.
+        """
+        with self.lock:
+            if window is None or window != self.window or not self.active:
+                return
+            self.requests_in_flight -= 1
+            self.requests_left -= 1
+            if self.requests_left > 0 or self.requests_in_flight > 0:
+                return
+            self.active = False
+            self.dump_thread = threading.Thread(target=self.finish, name="profiler-dump", daemon=True)
+            self.dump_thread.start()
+
+    def stop(self) -> Optional[str]:
+        """
+        End the profiling window early and dump the results.
+
+        Returns:
+            str: The directory the profile was written to, or None if no window was active.
+        """
+        with self.lock:
+            if not self.active:
+                return None
+            self.active = False
+        return self.finish()
+
+    def wait(self):
+        """
+        Wait until a profile being dumped in the background has been written.
+        """
+        if self.dump_thread is not None:
+            self.dump_thread.join()
+
+    def finish(self) -> str:
+        """
+        Stop sampling and write out what the ended window collected.
+
+        Returns:
+            str: The directory the profile was written to.
+        """
+        if self.sampler_thread is not None:
+            self.sampler_thread.join()
+            self.sampler_thread = None
+
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+        dump_dir = self.dump(snapshot)
+        with self.lock:
+            self.last_dump = dump_dir
+        print(f"Profile written to: {dump_dir}")
+        return dump_dir
+
+    def dump(self, snapshot) -> str:
+        """
+        Write the collected profile data to a new directory named after the window:
+        stacks.folded (for flamegraph.pl or speedscope), cprofile.prof (for pstats
+        or snakeviz), cprofile.txt and tracemalloc.txt.
+
+        Args:
+            snapshot (tracemalloc.Snapshot, optional): Allocation snapshot of the window.
+
+        Returns:
+            str: The directory the profile was written to.
+        """
+        timestamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        dump_dir = os.path.join(self.output_dir, f"{timestamp}-{self.window}")
+        os.makedirs(dump_dir, exist_ok=True)
+
+        with open(os.path.join(dump_dir, "stacks.folded"), "w") as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
+
+        if self.profiles:
+            stats = pstats.Stats(self.profiles[0])
+            for profile in self.profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(os.path.join(dump_dir, "cprofile.prof"))
+            with open(os.path.join(dump_dir, "cprofile.txt"), "w") as file:
+                pstats.Stats(os.path.join(dump_dir, "cprofile.prof"), stream=file).sort_stats("cumulative").print_stats(50)
+
+        if snapshot is not None:
+            with open(os.path.join(dump_dir, "tracemalloc.txt"), "w") as file:
+                for stat in snapshot.statistics("lineno")[:50]:
+                    file.write(f"{stat}\n")
+        return dump_dir
@@ -0,0 +1,148 @@
+import time
+import threading
+from collections import defaultdict, deque
+from typing import Optional
+from .Config import CONFIG_FILE, load_config
+
+
+class BudgetExceededError(Exception):
+    """
+    Raised when a request would exceed a model's configured usage budget.
+    """
+    pass
+
+
+class Usage_Tracker:
+    """
+    Aggregates token usage per chat and per model, and enforces rolling-window
+    token and request budgets configured in the [USAGE_BUDGETS] config section.
+    """
+
+    def __init__(self, config_file: str = CONFIG_FILE):
+        """
+        Initialize the Usage_Tracker.
+
+        Args:
+            config_file (str): Path to the config file holding the [USAGE_BUDGETS] section.
+        """
+        self.config = load_config(config_file)
+        budgets = self.config["USAGE_BUDGETS"] if self.config.has_section("USAGE_BUDGETS") else {}
+        self.budgets = budgets
+        self.window_seconds = float(budgets.get("WINDOW_SECONDS", "") or 3600)
+        self.fallback_model = budgets.get("FALLBACK_MODEL", "") or None
+
+        self.per_chat = defaultdict(self.empty_totals)
+        self.per_model = defaultdict(self.empty_totals)
+        self.events = defaultdict(deque)  # model -> deque of (timestamp, total_tokens)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def empty_totals() -> dict:
+        return {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "duration": 0.0,
+        }
+
+    def get_limit(self, model_name: str, kind: str) -> Optional[int]:
+        """
+        Look up a budget limit for a model.
+
+        Args:
+            model_name (str): The model name as shown in the UI (e.g. 'Grok').
+            kind (str): Either 'MAX_TOKENS' or 'MAX_REQUESTS'.
+
+        Returns:
+            int: The limit per window, or None if the model has no such budget.
+        """
+        value = self.budgets.get(f"{model_name}_{kind}", "")
+        return int(value) if value else None
+
+    def prune(self, model_name: str, now: float):
+        events = self.events[model_name]
+        while events and now - events[0][0] > self.window_seconds:
+            events.popleft()
+
+    def window_usage(self, model_name: str) -> dict:
+        """
+        Get a model's usage inside the current budget window.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            dict: Requests and tokens used in the window, with the configured limits.
+        """
+        with self.lock:
+            self.prune(model_name, time.monotonic())
+            events = self.events[model_name]
+            return {
+                "requests": len(events),
+                "tokens": sum(tokens for _, tokens in events),
+                "max_requests": self.get_limit(model_name, "MAX_REQUESTS"),
+                "max_tokens": self.get_limit(model_name, "MAX_TOKENS"),
+                "window_seconds": self.window_seconds,
+            }
+
+    def check_budget(self, model_name: str, estimated_tokens: int = 0):
+        """
+        Check that a request to a model fits its budget before it is sent.
+
+        Args:
+            model_name (str): The model name.
+            estimated_tokens (int): Estimated prompt tokens of the pending request.
+
+        Raises:
+            BudgetExceededError: If the request would exceed the model's budget.
+        """
+        usage = self.window_usage(model_name)
+        if usage["max_requests"] is not None and usage["requests"] >= usage["max_requests"]:
+            raise BudgetExceededError(
+                f"{model_name} request budget of {usage['max_requests']} per "
+                f"{usage['window_seconds']:.0f}s exhausted."
+            )
+        if usage["max_tokens"] is not None and usage["tokens"] + estimated_tokens > usage["max_tokens"]:
+            raise BudgetExceededError(
+                f"{model_name} token budget of {usage['max_tokens']} per "
+                f"{usage['window_seconds']:.0f}s exhausted."
+            )
+
+    def record(self, chat_id: Optional[str], model_name: str, usage: Optional[dict]):
+        """
+        Record the usage of a completed response.
+
+        Args:
+            chat_id (str, optional): The chat the response belongs to.
+            model_name (str): The model that produced the response.
+            usage (dict, optional): Usage as produced by LLM_Handler.make_usage.
+        """
+        usage = usage or {}
+        with self.lock:
+            targets = [self.per_model[model_name]]
+            if chat_id is not None:
+                targets.append(self.per_chat[chat_id])
+            for totals in targets:
+                totals["requests"] += 1
+                for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                    totals[key] += usage.get(key) or 0
+                totals["duration"] += usage.get("duration") or 0.0
+            self.events[model_name].append((time.monotonic(), usage.get("total_tokens") or 0))
+            self.prune(model_name, time.monotonic())
+
+    def get_report(self) -> dict:
+        """
+        Get usage totals per chat and per model, with throughput and budget state per model.
+
+        Returns:
+            dict: The usage report.
+        """
+        with self.lock:
+            per_chat = {chat_id: dict(totals) for chat_id, totals in self.per_chat.items()}
+            per_model = {model: dict(totals) for model, totals in self.per_model.items()}
+        for model, totals in per_model.items():
+            duration = totals["duration"]
+            totals["tokens_per_second"] = totals["completion_tokens"] / duration if duration else None
+            totals["budget"] = self.window_usage(model)
+        return {"chats": per_chat, "models": per_model}
@@ -3,22 +3,40 @@ from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import ollama
-import os, json
+import os, json, time, threading
+from collections import Counter
 
 from classes.Local_LLM_Handler import Local_LLM_Handler
 from classes.Grok_Handler import Grok_Handler
 from classes.ChatGPT_Handler import ChatGPT_Handler
 from classes.Chat import Chat
+from classes.Chat_Cache import Chat_Cache
+from classes.Chat_Maintenance import Chat_Maintenance
+from classes.Usage_Tracker import Usage_Tracker, BudgetExceededError
+from classes.Profiler import Profiler
 from pydantic import BaseModel
+from typing import Optional
 
 CHATS_DIR = "./chats"
 ONLINE_MODELS = ["Grok", "ChatGPT"]
+MODEL_LIST_TTL = 30  # Seconds to reuse the Ollama model list before asking again
+PROFILE_DIR = "./profiles"
 
 class AppState:
     def __init__(self):
         self.active_model = "llama2:latest"
         self.llm_handler = None
+        self.llm_handlers = {}  # model name -> handler, reused so sessions and stats survive model switches
         self.chat = Chat(None)
+        self.chat_cache = Chat_Cache(CHATS_DIR)
+        self.usage_tracker = Usage_Tracker()
+        self.profiler = Profiler(PROFILE_DIR)
+        self.models = None
+        self.models_fetched_at = 0.0
+        self.models_lock = threading.Lock()
+        self.streaming_chats = Counter()  # chat id -> number of responses being streamed into it
+        self.maintenance_skip = None      # Chat ids left alone by a running maintenance pass
+        self.chat_files_lock = threading.Lock()
 
 app = FastAPI()
 app.add_middleware(
@@ -31,6 +49,78 @@ app.add_middleware(
 
 app.state.state = AppState()
 
+class ProfiledRequestCounter:
+    """
+    Pure ASGI middleware counting requests towards the active profiling window.
+    When no window is active, requests are passed straight through.
+    """
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/api/debug/"):
+            return await self.app(scope, receive, send)
+        profiler = scope["app"].state.state.profiler
+        if not profiler.active:
+            return await self.app(scope, receive, send)
+
+        # The call returns once the whole response, including a streamed body, was sent
+        window = profiler.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.request_finished(window)
+
+app.add_middleware(ProfiledRequestCounter)
+
+@app.on_event("startup")
+def prefetch_on_startup():
+    """
+    Warm the chat cache and the model list in the background so the first
+    chat switch and model dropdown don't wait on disk or Ollama.
+    Setting LLM_NOTEPAD_PROFILE=<n> profiles the first n requests.
+    """
+    st = app.state.state
+    st.chat_cache.prefetch()
+    threading.Thread(target=get_installed_models, args=(st,), daemon=True).start()
+    profile_requests = os.environ.get("LLM_NOTEPAD_PROFILE")
+    if profile_requests:
+        st.profiler.start(requests=int(profile_requests))
+
+class ProfileRequest(BaseModel):
+    requests: int = 20
+    interval_ms: float = 5.0
+
+@app.post("/api/debug/profile")
+def start_profile(profile_request: ProfileRequest, request: Request):
+    """
+    Starts profiling the next `requests` requests. When they are done, folded
+    stacks, cProfile stats and a tracemalloc snapshot are written to ./profiles.
+    """
+    profiler = request.app.state.state.profiler
+    try:
+        profiler.start(requests=profile_request.requests, interval_ms=profile_request.interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.get_status()
+
+@app.get("/api/debug/profile")
+def get_profile_status(request: Request):
+    """
+    Returns whether a profiling window is active and where the last profile was written.
+    """
+    return request.app.state.state.profiler.get_status()
+
+@app.delete("/api/debug/profile")
+def stop_profile(request: Request):
+    """
+    Ends the profiling window early and writes out what was collected.
+    """
+    profiler = request.app.state.state.profiler
+    profiler.stop()
+    return profiler.get_status()
+
 class CreateChatRequest(BaseModel):
     name: str
 
@@ -49,7 +139,7 @@ def create_chat(request: CreateChatRequest):
     file_path = os.path.join(CHATS_DIR, chat_filename)
     
     cnt = 1 
-    while os.path.exists(file_path):
+    while os.path.exists(file_path) or os.path.exists(file_path + Chat.COMPRESSED_SUFFIX):
         chat_filename = f"{chat_name} ({cnt}).json"  # directly use that name as filename
         file_path = os.path.join(CHATS_DIR, chat_filename)
         cnt += 1
@@ -62,16 +152,24 @@ def create_chat(request: CreateChatRequest):
     return {"chat_id": chat_filename}
 
 @app.get("/api/chats")
-def list_chats():
+def list_chats(request: Request, include: str = Query(None)):
     """
-    Returns the list of saved chat files from ./chats
+    Returns the list of saved chat files from ./chats, most recently modified first.
+    With ?include=summary, also returns each chat's title, message count and
+    last-modified time, served from the chat cache where possible.
     """
     if not os.path.exists(CHATS_DIR):
         os.makedirs(CHATS_DIR)
 
-    files = os.listdir(CHATS_DIR)
-    chat_files = [f for f in files if f.endswith(".json")]
-    return {"chats": chat_files}
+    st = request.app.state.state
+    with st.profiler.section():
+        chat_files = st.chat_cache.list_chat_files()
+        # The UI lists chats right before the user picks one, so warm the most recent ones
+        st.chat_cache.prefetch(chat_files[:st.chat_cache.prefetch_count])
+
+        if include == "summary":
+            return {"chats": chat_files, "summaries": st.chat_cache.get_summaries()}
+        return {"chats": chat_files}
 
 @app.get("/api/chats/{chat_id}")
 def load_chat(chat_id: str, request: Request):
@@ -79,12 +177,85 @@ def load_chat(chat_id: str, request: Request):
     Loads the selected chat from the UI.
     """  
     st = request.app.state.state
-    file_path = os.path.join(CHATS_DIR, chat_id) if chat_id != "None" else None
-    st.chat = Chat(file_path)
+    with st.profiler.section():
+        if chat_id == "None":
+            st.chat = Chat(None)
+        else:
+            st.chat = st.chat_cache.get(os.path.join(CHATS_DIR, chat_id))
+
+        # Convert chat to JSON
+        message_list = st.chat.get_chat_history_json()
+        return {"messages": message_list}
+
+@app.get("/api/chats/{chat_id}/usage")
+def get_chat_usage(chat_id: str, request: Request):
+    """
+    Returns the token usage stored with a chat's messages, totalled per model.
+    """
+    st = request.app.state.state
+    file_path = os.path.join(CHATS_DIR, chat_id)
+    if st.chat_cache.file_stamp(file_path) is None:
+        raise HTTPException(status_code=404, detail="Chat not found.")
+    chat = st.chat_cache.get(file_path)
+    return {"chat_id": chat_id, "models": chat.get_usage_totals()}
+
+class MaintenanceRequest(BaseModel):
+    remove_empty_after_hours: float = 24
+    compress_after_days: Optional[float] = None
+    decompress: bool = False
+    dry_run: bool = False
+    workers: Optional[int] = None
+
+@app.post("/api/maintenance")
+def run_maintenance(maintenance_request: MaintenanceRequest, request: Request):
+    """
+    Removes abandoned empty chats and identical "(n)" copies, compacts chat files
+    and optionally compresses cold chats. Returns what was done and the space reclaimed.
+    The active chat and chats being streamed into are skipped. Until maintenance
+    is done, streams into other chats are refused and reads of them wait.
+    """
+    st = request.app.state.state
+    with st.chat_files_lock:
+        if st.maintenance_skip is not None:
+            raise HTTPException(status_code=409, detail="Chat maintenance is already running.")
+        skip_chat_ids = {chat_id for chat_id, count in st.streaming_chats.items() if count > 0}
+        if st.chat.chat_history_file is not None:
+            skip_chat_ids.add(os.path.basename(st.chat.chat_history_file))
+        st.maintenance_skip = skip_chat_ids
+        st.chat_cache.begin_maintenance(skip_chat_ids)
+
+    try:
+        maintenance = Chat_Maintenance(CHATS_DIR, workers=maintenance_request.workers)
+        report = maintenance.run(
+            remove_empty_after_hours=maintenance_request.remove_empty_after_hours,
+            compress_after_days=maintenance_request.compress_after_days,
+            decompress=maintenance_request.decompress,
+            dry_run=maintenance_request.dry_run,
+            skip_chat_ids=skip_chat_ids,
+        )
+    finally:
+        with st.chat_files_lock:
+            st.maintenance_skip = None
+            st.chat_cache.end_maintenance()
+    return report
+
+@app.get("/api/usage")
+def get_usage(request: Request):
+    """
+    Returns token usage per chat and per model since the server started,
+    with throughput and budget state per model.
+    """
+    return request.app.state.state.usage_tracker.get_report()
 
-    # Convert chat to JSON
-    message_list = st.chat.get_chat_history_json()
-    return {"messages": message_list}
+@app.get("/api/sessions")
+def get_sessions(request: Request):
+    """
+    Returns prefix reuse statistics of the active local model's chat sessions.
+    """
+    st = request.app.state.state
+    if not hasattr(st.llm_handler, "get_session_stats"):
+        return {"model": st.active_model, "prefix_reuse": False, "sessions": {}}
+    return st.llm_handler.get_session_stats()
 
 def list_ollama_models():
     """
@@ -98,9 +269,19 @@ def list_ollama_models():
     except:
         return []
 
+def get_installed_models(st: AppState, refresh: bool = False):
+    """
+    Returns the Ollama model list, reusing the last result for MODEL_LIST_TTL seconds.
+    """
+    with st.models_lock:
+        if refresh or st.models is None or time.monotonic() - st.models_fetched_at > MODEL_LIST_TTL:
+            st.models = list_ollama_models()
+            st.models_fetched_at = time.monotonic()
+        return list(st.models)
+
 @app.get("/api/models")
-def get_models():
-    models = list_ollama_models()
+def get_models(request: Request):
+    models = get_installed_models(request.app.state.state)
     models += ["Grok", "ChatGPT"]
     return {"models": models}
 
@@ -110,7 +291,11 @@ class ModelSelection(BaseModel):
 @app.post("/api/set_model")
 def set_model(selection: ModelSelection, request: Request):
     model_name = selection.model.strip()
-    installed = list_ollama_models()
+    st = request.app.state.state
+    installed = get_installed_models(st)
+    if model_name not in installed and model_name not in ONLINE_MODELS:
+        # The model may have been pulled since the list was cached
+        installed = get_installed_models(st, refresh=True)
     if model_name not in installed and model_name not in ONLINE_MODELS:
         raise HTTPException(status_code=400, detail="Model not found.")
     load_model(model_name, request)
@@ -123,13 +308,54 @@ def load_model(model_name: str, request: Request):
     """
     st = request.app.state.state
     st.active_model = model_name
+    st.llm_handler = get_llm_handler(st, model_name)
+    print(f"Active model set to: {model_name}")
+
+def get_llm_handler(st: AppState, model_name: str):
+    """
+    Returns the handler for a model, creating it only the first time the model is used.
+    """
+    if model_name not in st.llm_handlers:
+        st.llm_handlers[model_name] = create_llm_handler(model_name)
+    return st.llm_handlers[model_name]
+
+def create_llm_handler(model_name: str):
+    """
+    Creates the handler for an online model name or an installed Ollama model.
+    """
     if model_name == "Grok":
-        st.llm_handler = Grok_Handler()
+        return Grok_Handler()
     elif model_name == "ChatGPT":
-        st.llm_handler = ChatGPT_Handler()
-    else:
-        st.llm_handler = Local_LLM_Handler(model_name=st.active_model)
-    print(f"Active model set to: {model_name}")
+        return ChatGPT_Handler()
+    return Local_LLM_Handler(model_name=model_name)
+
+def estimate_prompt_tokens(chat: Chat, message: str) -> int:
+    """
+    Roughly estimates the prompt size of the next request (~4 characters per token).
+    """
+    chars = len(message) + sum(len(m.content) for m in chat.chat_history.messages)
+    return chars // 4
+
+def select_llm_handler(st: AppState, message: str):
+    """
+    Returns the handler to use for the next request, rerouting to the configured
+    fallback model when the active model is over its usage budget.
+
+    Raises:
+        BudgetExceededError: If neither the active nor the fallback model has budget left.
+    """
+    tracker = st.usage_tracker
+    estimated_tokens = estimate_prompt_tokens(st.chat, message)
+    try:
+        tracker.check_budget(st.llm_handler.get_llm_name(), estimated_tokens)
+        return st.llm_handler
+    except BudgetExceededError as e:
+        if tracker.fallback_model is None or tracker.fallback_model == st.llm_handler.get_llm_name():
+            raise
+        print(f"{e} Rerouting to {tracker.fallback_model}.")
+        fallback_handler = get_llm_handler(st, tracker.fallback_model)
+        tracker.check_budget(fallback_handler.get_llm_name(), estimated_tokens)
+        return fallback_handler
 
 @app.get("/api/chat/stream")
 def stream_chat(message: str, request: Request):
@@ -140,9 +366,37 @@ def stream_chat(message: str, request: Request):
     st = request.app.state.state
 
     def event_generator(user_message: str):
-        for chunk in st.chat.get_ai_response(user_message, st.llm_handler):
-            chunk = chunk.replace('\n', '\\n')
-            yield f"data: {chunk}\n\n"
+        chat = st.chat
+        chat_id = os.path.basename(chat.chat_history_file) if chat.chat_history_file else None
+        try:
+            llm_handler = select_llm_handler(st, user_message)
+        except BudgetExceededError as e:
+            yield f"data: [ERROR] {e}\n\n"
+            return
+
+        # Register the stream so maintenance won't rewrite the chat file while it is appended to
+        with st.chat_files_lock:
+            busy = st.maintenance_skip is not None and chat_id is not None and chat_id not in st.maintenance_skip
+            if not busy:
+                st.streaming_chats[chat_id] += 1
+        if busy:
+            yield "data: [ERROR] Chat maintenance is running, please try again shortly.\n\n"
+            return
+
+        try:
+            # Chunks are produced on varying worker threads, so streaming is covered by the
+            # profiler's stack sampler rather than a cProfile section
+            for chunk in chat.get_ai_response(user_message, llm_handler):
+                chunk = chunk.replace('\n', '\\n')
+                yield f"data: {chunk}\n\n"
+            st.usage_tracker.record(chat_id, llm_handler.get_llm_name(), chat.last_usage)
+            # The chat appended to its own file; keep the cached history instead of re-parsing it
+            st.chat_cache.refresh(chat)
+        finally:
+            with st.chat_files_lock:
+                st.streaming_chats[chat_id] -= 1
+                if st.streaming_chats[chat_id] <= 0:
+                    del st.streaming_chats[chat_id]
         yield "data: [DONE]\n\n"
 
     return StreamingResponse(event_generator(message), media_type="text/event-stream")
@@ -0,0 +1,35 @@
+import json
+import argparse
+from classes.Chat_Maintenance import Chat_Maintenance
+
+
+def main():
+    """
+    Garbage collect and compact the chats directory from the terminal.
+    """
+    parser = argparse.ArgumentParser(description="Clean up and compact LLM-Notepad chat files.")
+    parser.add_argument("--chats-dir", default="./chats", help="Directory holding the chat files")
+    parser.add_argument("--remove-empty-after-hours", type=float, default=24,
+                        help="Remove empty chats not modified for this many hours")
+    parser.add_argument("--compress-after-days", type=float, default=None,
+                        help="Compress chats not modified for this many days")
+    parser.add_argument("--decompress", action="store_true", help="Decompress every compressed chat")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be done")
+    args = parser.parse_args()
+
+    maintenance = Chat_Maintenance(args.chats_dir, workers=args.workers)
+    report = maintenance.run(
+        remove_empty_after_hours=args.remove_empty_after_hours,
+        compress_after_days=args.compress_after_days,
+        decompress=args.decompress,
+        dry_run=args.dry_run,
+    )
+    for chat in report["chats"]:
+        if chat["action"] != "unchanged":
+            print(f"{chat['action']}: {chat['chat_id']}")
+    print(json.dumps({k: v for k, v in report.items() if k != "chats"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+from typing import Optional
+from langchain_community.chat_message_histories import ChatMessageHistory
+from fastapi.testclient import TestClient
+from classes.LLM_Handler import LLM_Handler
+import main as server
+
+
+class Mock_LLM_Handler(LLM_Handler):
+    """
+    A stand-in backend that streams a canned response, so the server's own hot
+    path can be profiled without Ollama or API keys.
+    """
+
+    def __init__(self, words: int = 200, delay: float = 0.0):
+        """
+        Initialize the Mock_LLM_Handler.
+
+        Args:
+            words (int): Number of words in each response.
+            delay (float): Seconds to wait between streamed words.
+        """
+        super().__init__("mock")
+        self.words = words
+        self.delay = delay
+
+    def get_llm_name(self):
+        return 'Mock'
+
+    def get_response(self, prompt: str, history: Optional[ChatMessageHistory] = None,
+                     session_id: Optional[str] = None) -> str:
+        self.last_usage = None
+        for i in range(self.words):
+            if self.delay:
+                time.sleep(self.delay)
+            yield f"word{i} "
+        prompt_tokens = (len(prompt) + sum(len(m.content) for m in history.messages)) // 4 if history else 0
+        self.last_usage = self.make_usage(prompt_tokens, self.words)
+
+
+def write_sample_chats(chats_dir: str, chats: int, messages: int):
+    """
+    Write chat history files to profile against.
+    """
+    os.makedirs(chats_dir, exist_ok=True)
+    for c in range(chats):
+        with open(os.path.join(chats_dir, f"chat_{c}.json"), "w") as file:
+            for m in range(messages):
+                role = "user" if m % 2 == 0 else "assistant"
+                file.write(json.dumps({"role": role, "content": f"Message {m} of chat {c}. " * 20}) + "\n")
+
+
+def main():
+    """
+    Profile an end-to-end scenario against the server with a mock backend:
+    list chats, switch between them and stream responses.
+    """
+    parser = argparse.ArgumentParser(description="Profile the LLM-Notepad server hot path.")
+    parser.add_argument("--chats", type=int, default=20, help="Number of sample chats")
+    parser.add_argument("--messages", type=int, default=200, help="Messages per sample chat")
+    parser.add_argument("--turns", type=int, default=5, help="Streamed responses to request")
+    parser.add_argument("--words", type=int, default=200, help="Words per mock response")
+    parser.add_argument("--output", default=os.path.abspath("./profiles"), help="Profile output directory")
+    args = parser.parse_args()
+
+    original_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="llm-notepad-profile-")
+    os.chdir(work_dir)  # CHATS_DIR is relative, so the scenario runs against sample chats only
+    try:
+        write_sample_chats(server.CHATS_DIR, args.chats, args.messages)
+        st = server.app.state.state
+        st.profiler.output_dir = args.output
+
+        with TestClient(server.app) as client:
+            st.llm_handler = Mock_LLM_Handler(words=args.words)
+            chat_ids = [f"chat_{c}.json" for c in range(args.chats)]
+            total_requests = 1 + len(chat_ids) + args.turns
+            client.post("/api/debug/profile", json={"requests": total_requests})
+
+            client.get("/api/chats", params={"include": "summary"})
+            for chat_id in chat_ids:
+                client.get(f"/api/chats/{chat_id}")
+            for turn in range(args.turns):
+                client.get("/api/chat/stream", params={"message": f"Question {turn}"})
+
+            st.profiler.wait()
+            status = client.get("/api/debug/profile").json()
+    finally:
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if status["active"] or status["last_dump"] is None:
+        print("Profiling window did not complete.")
+        sys.exit(1)
+    print(f"Profile written to: {status['last_dump']}")
+    print("Render stacks.folded with flamegraph.pl or https://www.speedscope.app")
+
+
+if __name__ == "__main__":
+    main()